@@ -15,55 +15,156 @@ import subprocess
 import os
 import sys
 import json
-from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+import logging
+import logging.handlers
+import collections
+import queue
+import functools
+import fcntl
+import struct
+import gzip
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, parse_qsl
 import re
+import html
+import signal
 
 # Try to import RPi.GPIO
 try:
     import RPi.GPIO as GPIO
     GPIO_AVAILABLE = True
-    print("✅ GPIO library loaded")
 except ImportError:
     GPIO_AVAILABLE = False
-    print("❌ GPIO library not available - test mode")
+
+# Try to import orjson (optional, faster SmartRace event parsing)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+json_loads = orjson.loads if ORJSON_AVAILABLE else json.loads
+
+# Try to import aiohttp (optional, serves SmartRace events on an asyncio event loop)
+try:
+    import asyncio
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
 
 # Configuration
 RELAY1_PIN = 18  # Start signal relay
 RELAY2_PIN = 23  # End signal relay
 WEB_SERVER_PORT = 9090
 SMARTRACE_DATA_PORT = 9091
+HTTP_WORKERS = 8  # Worker threads per HTTP server
+NETWORK_WAIT_TIMEOUT = 10  # Max seconds to wait for an IP address at startup
 CONFIG_FILE = '/home/admin/smartrace_config.json'
+CONFIG_SAVE_DELAY = 1.0  # Seconds to batch config saves into one SD card write
+
+# SmartRace event names (lowercase) - payloads are matched case-insensitively
+_VSC_START_EVENTS = frozenset({'race.vsc_deployed', 'vscdeployed', 'vsc_deployed', 'vsc_started'})
+_VSC_END_EVENTS = frozenset({'race.vsc_retracted', 'vsc_withdrawn', 'vscended', 'vsc_ended'})
+
+# Logging - set SMARTRACE_DEBUG=1 to dump every SmartRace payload
+log = logging.getLogger("smartrace")
+log.setLevel(logging.DEBUG if os.environ.get('SMARTRACE_DEBUG') else logging.INFO)
+_log_listener = None  # Background thread that writes queued log records to stdout
 
 # Global state
-relay1_state = False
-relay2_state = False
+relay_state = {RELAY1_PIN: False, RELAY2_PIN: False}  # ON/OFF per relay pin
 server_running = False
-startup_time = datetime.now()
+startup_time = time.monotonic()  # Uptime clock - unaffected by NTP setting the wall clock after boot
 vsc_active = False
-vsc_end_time = None
+vsc_end_time = None  # time.monotonic() deadline for Relay 2
 last_smartrace_event = None
-smartrace_events_log = []
+smartrace_events_log = collections.deque(maxlen=100)  # Oldest events drop off automatically
 current_network_config = {}
 pulse_duration = 0.5  # Default pulse duration in seconds
 relay1_delay = 5.0 #Delay before Relay 1 pulses (in seconds)
+_vsc_wake = threading.Event()  # Set whenever vsc_active / vsc_end_time change
+_relay1_timer = None  # Pending delayed Relay 1 pulse
+_pulse_cancel = {RELAY1_PIN: threading.Event(), RELAY2_PIN: threading.Event()}  # Set to end a pulse early
+_pulse_queues = {RELAY1_PIN: queue.Queue(), RELAY2_PIN: queue.Queue()}  # Pending pulses per relay
+_config_cache = {'mtime': None, 'data': None}  # Last parsed CONFIG_FILE
+_save_timer = None  # Pending debounced config write
+_save_lock = threading.Lock()
+
+# WiFi scan cache - nmcli scans are slow and hammering them can upset the driver
+_WIFI_TTL = 30  # Seconds to reuse the last scan result
+_wifi_scan_cache = {'ts': 0.0, 'nets': []}
+_wifi_scan_lock = threading.Lock()
+
+# Network info caching - avoids shelling out to nmcli on every page render
+_NETINFO_TTL = 5  # Seconds to reuse the last network info
+_IP_TTL = 10  # Seconds to reuse the last IP address lookup
+SIOCGIFADDR = 0x8915  # ioctl request to read an interface address
+
+# Rendered pages - page name -> {'key', 'raw', 'gz'} of the last render
+_PAGE_CACHE = {}
+_PAGE_GZIP_LEVEL = 6  # Compressed at most once per render, so a mid level is plenty
+_LIVE_GZIP_LEVEL = 1  # The dashboard is compressed on every request - ~2.7KB of ~10KB for ~50us
+
+# Paths browsers request on their own - answered with an empty 204 before routing
+_NOISE_PATHS = frozenset({'/favicon.ico', '/apple-touch-icon.png', '/robots.txt'})
+
+def setup_logging():
+    """Queue log records for a background writer so handlers never block on stdout"""
+    global _log_listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(message)s'))
+    log_queue = queue.SimpleQueue()
+    logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
 
 def load_config():
-    """Load configuration from file"""
-    global pulse_duration
+    """Load configuration from file, skipping the parse if it hasn't changed"""
+    global pulse_duration, relay1_delay
     try:
         if os.path.exists(CONFIG_FILE):
+            mtime = os.stat(CONFIG_FILE).st_mtime
+            if mtime == _config_cache['mtime']:
+                return _config_cache['data']
+            
             with open(CONFIG_FILE, 'r') as f:
                 config = json.load(f)
-                pulse_duration = config.get('pulse_duration', 0.5)
-                relay1_delay = config.get('relay1_delay', 5.0)
-                print(f"✅ Loaded config: Pulse duration = {pulse_duration}s, Relay 1 delay = {relay1_delay}s")
+            _config_cache['mtime'] = mtime
+            _config_cache['data'] = config
+            
+            pulse_duration = config.get('pulse_duration', 0.5)
+            relay1_delay = config.get('relay1_delay', 5.0)
+            log.info(f"✅ Loaded config: Pulse duration = {pulse_duration}s, Relay 1 delay = {relay1_delay}s")
+            return config
     except Exception as e:
-        print(f"⚠️ Config load error: {e}, using defaults")
+        log.warning(f"⚠️ Config load error: {e}, using defaults")
         pulse_duration = 0.5
+        relay1_delay = 5.0
+    return None
 
 def save_config():
+    """Schedule a config save - saves within CONFIG_SAVE_DELAY seconds share one write"""
+    global _save_timer
+    with _save_lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+        _save_timer = threading.Timer(CONFIG_SAVE_DELAY, flush_config)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+def flush_config():
+    """Write a pending config save to file now"""
+    global _save_timer
+    with _save_lock:
+        if _save_timer is None:
+            return
+        _save_timer.cancel()
+        _save_timer = None
+    _write_config()
+
+def _write_config():
     """Save configuration to file"""
     try:
         config = {
@@ -72,14 +173,16 @@ def save_config():
         }
         with open(CONFIG_FILE, 'w') as f:
             json.dump(config, f, indent=2)
-        print(f"✅ Config saved: Pulse duration = {pulse_duration}s")
+        _config_cache['mtime'] = None  # Force the next load_config() to re-read
+        log.info(f"✅ Config saved: Pulse duration = {pulse_duration}s")
     except Exception as e:
-        print(f"❌ Config save error: {e}")
+        log.error(f"❌ Config save error: {e}")
 
 def setup_gpio():
     """Setup GPIO for relay control"""
     global GPIO_AVAILABLE
     if GPIO_AVAILABLE:
+        log.info("✅ GPIO library loaded")
         try:
             GPIO.setwarnings(False)
             GPIO.setmode(GPIO.BCM)
@@ -87,121 +190,179 @@ def setup_gpio():
             GPIO.setup(RELAY2_PIN, GPIO.OUT)
             GPIO.output(RELAY1_PIN, GPIO.LOW)
             GPIO.output(RELAY2_PIN, GPIO.LOW)
-            print(f"✅ GPIO pins {RELAY1_PIN} and {RELAY2_PIN} configured")
+            log.info(f"✅ GPIO pins {RELAY1_PIN} and {RELAY2_PIN} configured")
             return True
         except Exception as e:
-            print(f"❌ GPIO setup failed: {e}")
+            log.error(f"❌ GPIO setup failed: {e}")
             GPIO_AVAILABLE = False
             return False
+    log.error("❌ GPIO library not available - test mode")
     return False
 
 def pulse_relay(relay_pin, relay_name, source="Manual"):
     """Pulse a relay ON then OFF"""
-    global relay1_state, relay2_state, pulse_duration
-    
     if GPIO_AVAILABLE:
+        # Bind hot names to locals so the ON/OFF edges skip global lookups
+        output, high, low = GPIO.output, GPIO.HIGH, GPIO.LOW
+        cancel = _pulse_cancel[relay_pin]
+        duration = pulse_duration
         try:
-            # Turn relay ON
-            GPIO.output(relay_pin, GPIO.HIGH)
-            if relay_pin == RELAY1_PIN:
-                relay1_state = True
-            else:
-                relay2_state = True
-            print(f"🔌 {relay_name} ON (pulse start) by {source} at {datetime.now().strftime('%H:%M:%S')}")
+            # Turn relay ON - drop any cancel request left over from before this pulse
+            cancel.clear()
+            output(relay_pin, high)
+            relay_state[relay_pin] = True
+            log.info(f"🔌 {relay_name} ON (pulse start) by {source} at {time.strftime('%H:%M:%S')}")
             
-            # Wait for pulse duration
-            time.sleep(pulse_duration)
+            # Wait for pulse duration (cut short if _pulse_cancel is set)
+            cancel.wait(duration)
+            cancel.clear()
             
             # Turn relay OFF
-            GPIO.output(relay_pin, GPIO.LOW)
-            if relay_pin == RELAY1_PIN:
-                relay1_state = False
-            else:
-                relay2_state = False
-            print(f"🔌 {relay_name} OFF (pulse end) by {source} at {datetime.now().strftime('%H:%M:%S')}")
+            output(relay_pin, low)
+            relay_state[relay_pin] = False
+            log.info(f"🔌 {relay_name} OFF (pulse end) by {source} at {time.strftime('%H:%M:%S')}")
             
             return True
         except Exception as e:
-            print(f"❌ Relay pulse error: {e}")
+            log.error(f"❌ Relay pulse error: {e}")
             return False
     else:
-        print(f"🧪 Test - {relay_name} PULSE by {source}")
+        log.info(f"🧪 Test - {relay_name} PULSE by {source}")
         return True
 
 def pulse_relay_threaded(relay_pin, relay_name, source="Manual"):
-    """Pulse a relay in a separate thread"""
-    thread = threading.Thread(target=pulse_relay, args=(relay_pin, relay_name, source))
-    thread.daemon = True
-    thread.start()
+    """Queue a relay pulse for that relay's worker thread"""
+    _pulse_queues[relay_pin].put((relay_name, source))
+
+def _pulse_worker(relay_pin):
+    """Fire queued pulses for one relay, one after another"""
+    pulse_q = _pulse_queues[relay_pin]
+    while True:
+        relay_name, source = pulse_q.get()
+        pulse_relay(relay_pin, relay_name, source)
+
+def start_pulse_workers():
+    """Start one long-lived pulse worker per relay"""
+    for relay_pin in _pulse_queues:
+        threading.Thread(target=_pulse_worker, args=(relay_pin,), daemon=True).start()
 
 def monitor_vsc_timer():
     """Monitor VSC timer and trigger Relay 2 when it ends"""
     global vsc_active, vsc_end_time
     
+    # Bind loop helpers to locals once instead of looking them up every pass
+    now, wait, clear = time.monotonic, _vsc_wake.wait, _vsc_wake.clear
+    
     while True:
         try:
+            # Sleep until the VSC deadline, or until do_POST changes the timer
+            timeout = None
             if vsc_active and vsc_end_time is not None:
-                current_time = time.time()
-                if current_time >= vsc_end_time:
-                    print("⏰ VSC timer ended - triggering Relay 2 (End Signal)")
+                timeout = max(0, vsc_end_time - now())
+            wait(timeout)
+            clear()
+            
+            if vsc_active and vsc_end_time is not None:
+                if now() >= vsc_end_time:
+                    log.info("⏰ VSC timer ended - triggering Relay 2 (End Signal)")
                     pulse_relay_threaded(RELAY2_PIN, "Relay 2", "VSC Timer End")
                     vsc_active = False
                     vsc_end_time = None
-            time.sleep(0.1)  # Check every 100ms
         except Exception as e:
-            print(f"❌ Timer monitor error: {e}")
+            log.error(f"❌ Timer monitor error: {e}")
             time.sleep(1)
 
-def scan_wifi_networks():
+def scan_wifi_networks(force=False):
+    """Return available WiFi networks, reusing the last scan for _WIFI_TTL seconds"""
+    with _wifi_scan_lock:
+        if not force and time.monotonic() - _wifi_scan_cache['ts'] < _WIFI_TTL:
+            return _wifi_scan_cache['nets']
+        
+        if force:
+            try:
+                subprocess.run(['sudo', 'nmcli', 'dev', 'wifi', 'rescan'],
+                              capture_output=True, timeout=10)
+            except Exception as e:
+                log.warning(f"⚠️ WiFi rescan error: {e}")
+        
+        networks = _run_wifi_scan()
+        _wifi_scan_cache['ts'] = time.monotonic()
+        _wifi_scan_cache['nets'] = networks
+        return networks
+
+def _run_wifi_scan():
     """Scan for available WiFi networks"""
     try:
-        result = subprocess.run(['sudo', 'nmcli', 'dev', 'wifi', 'list'], 
+        result = subprocess.run(['sudo', 'nmcli', '-t', '-f', 'IN-USE,SSID,SIGNAL', 'dev', 'wifi', 'list'], 
                               capture_output=True, text=True, timeout=10)
         if result.returncode == 0:
             networks = []
-            lines = result.stdout.split('\n')[1:]  # Skip header
-            for line in lines:
-                if line.strip():
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        in_use = '*' in line
-                        ssid = parts[1] if not in_use else parts[2]
-                        signal = '0'
-                        for part in parts:
-                            if '%' in part:
-                                signal = part.replace('%', '')
-                                break
-                        
-                        networks.append({
-                            'ssid': ssid,
-                            'signal': signal,
-                            'in_use': in_use
-                        })
+            for line in result.stdout.splitlines():
+                # Terse mode is IN-USE:SSID:SIGNAL with ':' inside SSID escaped as '\:'
+                in_use, _, rest = line.partition(':')
+                ssid, _, signal = rest.rpartition(':')
+                ssid = ssid.replace('\\:', ':')
+                if not ssid:
+                    continue  # Hidden network
+                
+                networks.append({
+                    'ssid': ssid,
+                    'signal': signal if signal.isdigit() else '0',
+                    'in_use': in_use == '*'
+                })
             return networks
         return []
     except Exception as e:
-        print(f"❌ WiFi scan error: {e}")
+        log.error(f"❌ WiFi scan error: {e}")
         return []
 
+def ttl_cache(ttl):
+    """Cache a no-argument function's result for ttl seconds (clear with .cache_clear())"""
+    def decorator(fn):
+        cached = None  # (expires, value) of the last call
+        
+        @functools.wraps(fn)
+        def wrapper():
+            nonlocal cached
+            entry = cached
+            if entry is not None and time.monotonic() < entry[0]:
+                return entry[1]
+            value = fn()
+            cached = (time.monotonic() + ttl, value)
+            return value
+        
+        def cache_clear():
+            nonlocal cached
+            cached = None
+        
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+def _get_interface_ip(ifname):
+    """Read an interface's IPv4 address straight from the kernel (SIOCGIFADDR)"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        res = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', ifname.encode()[:15]))
+        return socket.inet_ntoa(res[20:24])
+    except OSError:
+        return None
+    finally:
+        s.close()
+
+@ttl_cache(_NETINFO_TTL)
 def get_current_network_info():
     """Get current network configuration"""
     try:
-        result = subprocess.run(['nmcli', 'con', 'show', '--active'], 
+        result = subprocess.run(['nmcli', '-t', '-f', 'NAME,TYPE,DEVICE', 'con', 'show', '--active'], 
                               capture_output=True, text=True)
         if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            for line in lines:
-                if 'wifi' in line.lower():
-                    parts = line.split()
-                    ssid = parts[0]
-                    
-                    ip_result = subprocess.run(['ip', 'addr', 'show', 'wlan0'], 
-                                             capture_output=True, text=True)
-                    ip_address = 'N/A'
-                    for ip_line in ip_result.stdout.split('\n'):
-                        if 'inet ' in ip_line:
-                            ip_address = ip_line.strip().split()[1].split('/')[0]
-                            break
+            for line in result.stdout.splitlines():
+                # Terse mode is NAME:TYPE:DEVICE with ':' inside NAME escaped as '\:'
+                parts = line.rsplit(':', 2)
+                if len(parts) == 3 and parts[1] in ('802-11-wireless', 'wifi'):
+                    ssid = parts[0].replace('\\:', ':')
+                    ip_address = _get_interface_ip(parts[2] or 'wlan0') or 'N/A'
                     
                     return {
                         'ssid': ssid,
@@ -210,11 +371,16 @@ def get_current_network_info():
                     }
         return {'ssid': 'Not Connected', 'ip': 'N/A', 'connected': False}
     except Exception as e:
-        print(f"❌ Network info error: {e}")
+        log.error(f"❌ Network info error: {e}")
         return {'ssid': 'Error', 'ip': 'N/A', 'connected': False}
 
+@ttl_cache(_IP_TTL)
 def get_ip_address():
     """Get current IP address"""
+    return _get_interface_ip('wlan0') or _get_routed_ip_address()
+
+def _get_routed_ip_address():
+    """Get the IP address of the default route (fallback when wlan0 has none)"""
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
@@ -227,7 +393,7 @@ def get_ip_address():
 def connect_to_wifi(ssid, password, use_dhcp=True, static_ip='', gateway='', dns='8.8.8.8'):
     """Connect to WiFi network with DHCP or static IP"""
     try:
-        print(f"🔧 Connecting to {ssid}...")
+        log.info(f"🔧 Connecting to {ssid}...")
         
         subprocess.run(['sudo', 'nmcli', 'con', 'delete', ssid], 
                       capture_output=True)
@@ -244,26 +410,35 @@ def connect_to_wifi(ssid, password, use_dhcp=True, static_ip='', gateway='', dns
         if result.returncode != 0:
             return False, f"Failed to create connection: {result.stderr}"
         
-        result = subprocess.run([
+        # Security and IP settings go in a single nmcli call
+        modify_args = [
             'sudo', 'nmcli', 'con', 'modify', ssid,
             'wifi-sec.key-mgmt', 'wpa-psk',
             'wifi-sec.psk', password
-        ], capture_output=True, text=True)
-        
-        if not use_dhcp:
-            result = subprocess.run([
-                'sudo', 'nmcli', 'con', 'modify', ssid,
+        ]
+        if use_dhcp:
+            modify_args += ['ipv4.method', 'auto']
+        else:
+            modify_args += [
                 'ipv4.addresses', static_ip,
                 'ipv4.gateway', gateway,
                 'ipv4.dns', dns,
                 'ipv4.method', 'manual'
-            ], capture_output=True, text=True)
+            ]
+        result = subprocess.run(modify_args, capture_output=True, text=True, timeout=10)
+        
+        if result.returncode != 0:
+            return False, f"Failed to configure connection: {result.stderr}"
         
         result = subprocess.run(['sudo', 'nmcli', 'con', 'up', ssid], 
                               capture_output=True, text=True, timeout=30)
         
         if result.returncode == 0:
             time.sleep(2)
+            # The connection changed - drop everything derived from the old one
+            get_current_network_info.cache_clear()
+            get_ip_address.cache_clear()
+            _PAGE_CACHE.clear()
             return True, f"Connected successfully to {ssid}"
         else:
             return False, f"Connection failed: {result.stderr}"
@@ -271,170 +446,256 @@ def connect_to_wifi(ssid, password, use_dhcp=True, static_ip='', gateway='', dns
     except Exception as e:
         return False, f"Connection error: {str(e)}"
 
-class SmartRaceDataHandler(BaseHTTPRequestHandler):
+class RelayRequestHandler(BaseHTTPRequestHandler):
+    """Socket tuning shared by the SmartRace and web interface handlers"""
+    
+    protocol_version = 'HTTP/1.1'  # Keep-alive - every response must carry Content-Length
+    wbufsize = 64 * 1024  # Buffer headers + body so a response leaves in a single send()
+    disable_nagle_algorithm = True  # TCP_NODELAY - send small responses immediately
+    timeout = 5  # Drop clients that stall mid-request instead of tying up a thread
+    idle_timeout = 1  # Close a keep-alive connection this long after its last response
+    
+    def setup(self):
+        # Base setup applies TCP_NODELAY. Keepalive only matters while a slow handler (nmcli scan,
+        # WiFi connect) holds the connection; the 2 hour kernel default is shortened, but kept
+        # loose enough that a phone dozing on power-saving WiFi is not cut off mid-response
+        super().setup()
+        conn = self.connection
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):  # Linux - the Pi's platform
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 5)
+    
+    def handle(self):
+        """Serve requests on one connection, releasing the pool worker once the client goes idle"""
+        self.close_connection = True
+        wait = self.timeout  # A new connection gets the full timeout for its first request
+        while self.request_waiting(wait):
+            self.response_sent = False
+            self.handle_one_request()
+            if self.close_connection:
+                break
+            wait = self.idle_timeout
+    
+    def request_waiting(self, wait):
+        """Wait up to wait seconds for the next request to start arriving"""
+        self.connection.settimeout(wait)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:  # Includes socket.timeout
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def read_body(self):
+        """Read the Content-Length request body into a preallocated bytearray"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = bytearray(content_length)
+        if content_length:
+            received = self.rfile.readinto(body)
+            del body[received:]  # Client sent less than it announced
+        return body
+    
+    def send_content(self, code, body=b'', content_type='text/html', headers=()):
+        """Send a complete response with Content-Length"""
+        self.send_response(code)
+        if body:
+            self.send_header('Content-Type', content_type)
+        if code != 204:  # 204 responses must not carry Content-Length
+            self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.response_sent = True  # Headers are in wfile now - too late to replace them
+        if body:
+            self.wfile.write(body)
+    
+    def send_failure(self):
+        """Answer 500 and close the connection, unless a response already went out"""
+        self.close_connection = True
+        self._headers_buffer = []  # Drop any half-built header block
+        if not self.response_sent:
+            self.send_content(500)
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def log_request(self, code='-', size='-'):
+        pass  # Skip formatting the request line just to have log_message() drop it
+    
+    def log_error(self, format, *args):
+        pass
+
+def handle_smartrace_event(post_data):
+    """Parse one SmartRace event body and drive the relays"""
+    global vsc_active, last_smartrace_event, smartrace_events_log, vsc_end_time, _relay1_timer
+    
+    # DEBUG: Dump raw data to see what SmartRace actually sends (SMARTRACE_DEBUG=1)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("=" * 60)
+        log.debug("📥 RAW DATA FROM SMARTRACE:\n%s", post_data.decode('utf-8', 'replace'))
+    
+    data = json_loads(post_data)  # Both parsers take raw bytes directly
+    
+    # DEBUG: Dump parsed JSON structure - only pretty-print when someone will read it
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("📊 PARSED JSON STRUCTURE:\n%s", json.dumps(data, indent=2))
+        log.debug("=" * 60)
+    
+    event_type = data.get('event_type', '')
+    
+    # Also check if data is at root level (some apps structure differently)
+    if not event_type:
+        event_type = data.get('type', '')
+    
+    last_smartrace_event = {
+        'time': time.strftime('%H:%M:%S'),
+        'type': event_type,
+        'data': data
+    }
+    
+    smartrace_events_log.append(last_smartrace_event)
+    
+    log.info(f"📡 SmartRace event type detected: '{event_type}'")
+    
+    # VSC Start - Pulse Relay 1
+    # Check multiple possible event names
+    event_key = str(event_type).lower()
+    if event_key in _VSC_START_EVENTS:
+        vsc_data = data.get('event', {}).get('data', {})
+        if not vsc_data:
+            vsc_data = data.get('data', {})
+        
+        duration = vsc_data.get('duration', 60)  # Default 60 seconds
+        
+        log.info(f"🏁 VSC DEPLOYED - Duration: {duration}s")
+        log.info(f"   → Triggering Relay 1 (Start Signal)")
+        
+        # Pulse Relay 1 after the start delay without holding up the response
+        log.info(f"⏳ Waiting {relay1_delay}s before triggering Relay 1...")
+        if _relay1_timer is not None:
+            _relay1_timer.cancel()
+        _relay1_timer = threading.Timer(relay1_delay, pulse_relay_threaded,
+                                        args=(RELAY1_PIN, "Relay 1", "VSC Start"))
+        _relay1_timer.daemon = True
+        _relay1_timer.start()
+        
+        # Set up timer for Relay 2 (end signal), counted from the Relay 1 pulse
+        vsc_active = True
+        relay2_delay = relay1_delay + duration
+        vsc_end_time = time.monotonic() + relay2_delay
+        _vsc_wake.set()
+        
+        relay2_at = time.strftime('%H:%M:%S', time.localtime(time.time() + relay2_delay))
+        log.info(f"   → Relay 2 will trigger in {relay2_delay}s at {relay2_at}")
+    
+    # VSC Withdrawn early - Cancel timer
+    elif event_key in _VSC_END_EVENTS:
+        log.info(f"🏁 VSC WITHDRAWN - Cancelling timer")
+        if _relay1_timer is not None:
+            _relay1_timer.cancel()
+            _relay1_timer = None
+        _pulse_cancel[RELAY1_PIN].set()  # End a Relay 1 pulse still in progress
+        pulse_relay_threaded(RELAY2_PIN, "Relay 2", "VSC Manual Retract")
+        vsc_active = False
+        vsc_end_time = None
+        _vsc_wake.set()
+    else:
+        log.warning(f"⚠️ Unknown event type: '{event_type}' - no action taken")
+
+class SmartRaceDataHandler(RelayRequestHandler):
     """Handler for SmartRace data interface"""
     
     def do_POST(self):
-        global vsc_active, last_smartrace_event, smartrace_events_log, vsc_end_time
-        
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            
-            # DEBUG: Print raw data to see what SmartRace actually sends
-            print("=" * 60)
-            print("📥 RAW DATA FROM SMARTRACE:")
-            print(post_data)
-            print("=" * 60)
-            
-            data = json.loads(post_data)
-            
-            # DEBUG: Print parsed JSON structure
-            print("📊 PARSED JSON STRUCTURE:")
-            print(json.dumps(data, indent=2))
-            print("=" * 60)
-            
-            event_type = data.get('event_type', '')
-            
-            # Also check if data is at root level (some apps structure differently)
-            if not event_type:
-                event_type = data.get('type', '')
-            
-            last_smartrace_event = {
-                'time': datetime.now().strftime('%H:%M:%S'),
-                'type': event_type,
-                'data': data
-            }
-            
-            smartrace_events_log.append(last_smartrace_event)
-            if len(smartrace_events_log) > 100:
-                smartrace_events_log.pop(0)
-            
-            print(f"📡 SmartRace event type detected: '{event_type}'")
-            
-            # VSC Start - Pulse Relay 1
-            # Check multiple possible event names
-            if event_type in ['race.vsc_deployed', 'vscDeployed', 'vsc_deployed', 'vsc_started', 'VSC_DEPLOYED']:
-                vsc_data = data.get('event', {}).get('data', {})
-                if not vsc_data:
-                    vsc_data = data.get('data', {})
-                
-                duration = vsc_data.get('duration', 60)  # Default 60 seconds
-                
-                print(f"🏁 VSC DEPLOYED - Duration: {duration}s")
-                print(f"   → Triggering Relay 1 (Start Signal)")
-                
-                # Pulse Relay 1 immediately (start signal)
-                print(f"⏳ Waiting {relay1_delay}s before triggering Relay 1...")
-                time.sleep(relay1_delay)
-                pulse_relay_threaded(RELAY1_PIN, "Relay 1", "VSC Start")
-                
-                # Set up timer for Relay 2 (end signal)
-                vsc_active = True
-                vsc_end_time = time.time() + duration
-                
-                print(f"   → Relay 2 will trigger in {duration}s at {datetime.fromtimestamp(vsc_end_time).strftime('%H:%M:%S')}")
-            
-            # VSC Withdrawn early - Cancel timer
-            elif event_type in ['race.vsc_retracted', 'vsc_Withdrawn','vsc_withdrawn', 'vscEnded', 'vsc_ended', 'VSC_WITHDRAWN']:
-                print(f"🏁 VSC WITHDRAWN - Cancelling timer")
-                pulse_relay_threaded(RELAY2_PIN, "Relay 2", "VSC Manual Retract")
-                vsc_active = False
-                vsc_end_time = None
-            else:
-                print(f"⚠️ Unknown event type: '{event_type}' - no action taken")
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(b'{"status":"ok"}')
+            handle_smartrace_event(self.read_body())
+            self.send_content(200, b'{"status":"ok"}', 'application/json')
             
         except Exception as e:
-            print(f"❌ SmartRace data error: {e}")
-            import traceback
-            traceback.print_exc()
-            self.send_response(500)
-            self.end_headers()
-    
-    def log_message(self, format, *args):
-        pass
+            log.exception(f"❌ SmartRace data error: {e}")
+            self.send_failure()
+
+def get_cached_page(name, key, render):
+    """Return a page's cache entry, re-rendering only when its key changes"""
+    page = _PAGE_CACHE.get(name)
+    if page is None or page['key'] != key:
+        # 'gz' is filled in by the first request that accepts gzip (see WebHandler.send_page)
+        page = {'key': key, 'raw': render().encode(), 'gz': None}
+        _PAGE_CACHE[name] = page
+    return page
 
-def wifi_config_page():
-    """WiFi configuration page HTML"""
-    networks = scan_wifi_networks()
+def wifi_config_page(rescan=False):
+    """WiFi configuration page cache entry"""
+    networks = scan_wifi_networks(force=rescan)
     network_info = get_current_network_info()
     
-    networks_html = ""
-    for net in networks:
-        signal_bars = "🟢" if int(net['signal']) > 70 else "🟡" if int(net['signal']) > 40 else "🔴"
-        active = " (Connected)" if net['in_use'] else ""
-        networks_html += f'<option value="{net["ssid"]}">{net["ssid"]} {signal_bars} {net["signal"]}%{active}</option>\n'
-    
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>WiFi Configuration</title>
-    <style>
-        body {{
+    # The page only changes when a new scan lands or the connection changes
+    key = (_wifi_scan_cache['ts'], network_info['ssid'], network_info['ip'])
+    return get_cached_page('wifi', key, lambda: _render_wifi_page(networks, network_info))
+
+# Static parts of the WiFi page, built once at import
+_WIFI_CSS = """
+        body {
             font-family: -apple-system, BlinkMacSystemFont, Arial, sans-serif;
             background: #F2F2F7;
             padding: 20px;
             margin: 0;
-        }}
-        .container {{
+        }
+        .container {
             max-width: 600px;
             margin: 0 auto;
-        }}
-        h1 {{
+        }
+        h1 {
             color: #1C1C1E;
             font-size: 32px;
             font-weight: 700;
             margin-bottom: 10px;
-        }}
-        .current-network {{
+        }
+        .current-network {
             background: white;
             padding: 20px;
             border-radius: 15px;
             margin-bottom: 20px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        .section {{
+        }
+        .section {
             background: white;
             padding: 20px;
             border-radius: 15px;
             margin-bottom: 20px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        .form-group {{
+        }
+        .form-group {
             margin-bottom: 15px;
-        }}
-        label {{
+        }
+        label {
             display: block;
             font-weight: 600;
             margin-bottom: 5px;
             color: #1C1C1E;
-        }}
-        input, select {{
+        }
+        input, select {
             width: 100%;
             padding: 12px;
             border: 1px solid #D1D1D6;
             border-radius: 10px;
             font-size: 16px;
             box-sizing: border-box;
-        }}
-        .radio-group {{
+        }
+        .radio-group {
             display: flex;
             gap: 20px;
             margin-top: 10px;
-        }}
-        .radio-option {{
+        }
+        .radio-option {
             display: flex;
             align-items: center;
             gap: 8px;
-        }}
-        .button {{
+        }
+        .button {
             width: 100%;
             padding: 14px;
             background: #007AFF;
@@ -445,25 +706,42 @@ def wifi_config_page():
             font-weight: 600;
             cursor: pointer;
             margin-top: 10px;
-        }}
-        .button:hover {{
+        }
+        .button:hover {
             background: #0051D5;
-        }}
-        .back-link {{
+        }
+        .back-link {
             display: block;
             text-align: center;
             margin-top: 20px;
             color: #007AFF;
             text-decoration: none;
-        }}
-        .static-fields {{
+        }
+        .rescan-link {
+            display: inline-block;
+            margin-top: 8px;
+            color: #007AFF;
+            text-decoration: none;
+            font-size: 14px;
+        }
+        .static-fields {
             display: none;
             margin-top: 10px;
-        }}
-        .static-fields.visible {{
+        }
+        .static-fields.visible {
             display: block;
-        }}
-    </style>
+        }
+"""
+
+_WIFI_OPTION_TEMPLATE = '<option value="{ssid}">{ssid} {bars} {signal}%{active}</option>\n'
+
+_WIFI_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>WiFi Configuration</title>
+    <style>{css}    </style>
     <script>
         function toggleIPMode() {{
             const mode = document.querySelector('input[name="ip_mode"]:checked').value;
@@ -481,8 +759,8 @@ def wifi_config_page():
         <h1>🌐 WiFi Configuration</h1>
         
         <div class="current-network">
-            <strong>Current Network:</strong> {network_info['ssid']}<br>
-            <strong>IP Address:</strong> {network_info['ip']}
+            <strong>Current Network:</strong> {ssid}<br>
+            <strong>IP Address:</strong> {ip}
         </div>
         
         <form method="POST" action="/wifi/connect" class="section">
@@ -491,6 +769,7 @@ def wifi_config_page():
                 <select name="ssid" required>
                     {networks_html}
                 </select>
+                <a href="/wifi?rescan=true" class="rescan-link">🔄 Rescan networks</a>
             </div>
             
             <div class="form-group">
@@ -502,11 +781,13 @@ def wifi_config_page():
                 <label>IP Configuration</label>
                 <div class="radio-group">
                     <div class="radio-option">
-                        <input type="radio" id="dhcp" name="ip_mode" value="dhcp" checked onchange="toggleIPMode()">
+                        <input type="radio" id="dhcp" name="ip_mode" value="dhcp" checked
+                               onchange="toggleIPMode()">
                         <label for="dhcp" style="margin: 0">DHCP (Automatic)</label>
                     </div>
                     <div class="radio-option">
-                        <input type="radio" id="static" name="ip_mode" value="static" onchange="toggleIPMode()">
+                        <input type="radio" id="static" name="ip_mode" value="static"
+                               onchange="toggleIPMode()">
                         <label for="static" style="margin: 0">Static IP</label>
                     </div>
                 </div>
@@ -534,76 +815,110 @@ def wifi_config_page():
     </div>
 </body>
 </html>"""
-    return html
 
-def web_page():
-    """Main web interface HTML"""
-    global relay1_state, relay2_state, vsc_active, vsc_end_time, pulse_duration
-    
-    uptime = datetime.now() - startup_time
-    hours = int(uptime.total_seconds() // 3600)
-    minutes = int((uptime.total_seconds() % 3600) // 60)
-    
-    current_ip = get_ip_address()
-    network_info = get_current_network_info()
+def _render_wifi_page(networks, network_info):
+    """Render the WiFi configuration page HTML"""
+    networks_html = ''.join([
+        _WIFI_OPTION_TEMPLATE.format(
+            ssid=html.escape(net['ssid'], quote=True),  # Anyone in radio range picks SSIDs
+            bars="🟢" if int(net['signal']) > 70 else "🟡" if int(net['signal']) > 40 else "🔴",
+            signal=net['signal'],
+            active=" (Connected)" if net['in_use'] else ""
+        )
+        for net in networks
+    ])
     
-    relay1_status = "🟢 Active" if relay1_state else "⚫ Inactive"
-    relay1_color = "#34C759" if relay1_state else "#8E8E93"
-    
-    relay2_status = "🟢 Active" if relay2_state else "⚫ Inactive"
-    relay2_color = "#34C759" if relay2_state else "#8E8E93"
-    
-    vsc_status = "🟢 Running" if vsc_active else "⚫ Inactive"
-    vsc_color = "#34C759" if vsc_active else "#8E8E93"
-    
-    vsc_time_remaining = ""
-    if vsc_active and vsc_end_time is not None:
-        remaining = max(0, int(vsc_end_time - time.time()))
-        vsc_time_remaining = f" ({remaining}s remaining)"
-    
-    html = f"""<!DOCTYPE html>
+    return _WIFI_PAGE_TEMPLATE.format(
+        css=_WIFI_CSS,
+        ssid=html.escape(network_info['ssid'], quote=True),
+        ip=network_info['ip'],
+        networks_html=networks_html
+    )
+
+_WIFI_RESULT_TEMPLATE = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>SmartRace Relay Controller</title>
-    <meta http-equiv="refresh" content="10">
+    <title>Connection Result</title>
     <style>
-        * {{
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, Arial, sans-serif;
+            background: #F2F2F7;
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            min-height: 100vh;
+            padding: 20px;
+        }}
+        .container {{
+            background: white;
+            padding: 40px;
+            border-radius: 20px;
+            text-align: center;
+            max-width: 400px;
+        }}
+        h1 {{ color: {status_color}; }}
+        .button {{
+            display: inline-block;
+            padding: 12px 24px;
+            background: #007AFF;
+            color: white;
+            text-decoration: none;
+            border-radius: 10px;
+            margin-top: 20px;
+        }}
+    </style>
+    <meta http-equiv="refresh" content="5;url=/">
+</head>
+<body>
+    <div class="container">
+        <h1>{status}</h1>
+        <p>{message}</p>
+        <p>Redirecting in 5 seconds...</p>
+        <a href="/" class="button">Go Back Now</a>
+    </div>
+</body>
+</html>"""
+
+# Static parts of the main page, built once at import - web_page() only
+# fills in the dynamic fields
+_STATIC_CSS = """
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
-        body {{
+        }
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             min-height: 100vh;
             padding: 20px;
-        }}
-        .container {{
+        }
+        .container {
             max-width: 800px;
             margin: 0 auto;
-        }}
-        h1 {{
+        }
+        h1 {
             color: white;
             font-size: 36px;
             font-weight: 700;
             margin-bottom: 10px;
             text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-        }}
-        .subtitle {{
+        }
+        .subtitle {
             color: rgba(255,255,255,0.9);
             font-size: 16px;
             margin-bottom: 30px;
-        }}
-        .section {{
+        }
+        .section {
             background: white;
             padding: 25px;
             border-radius: 20px;
             margin-bottom: 20px;
             box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-        }}
-        .section-title {{
+        }
+        .section-title {
             font-size: 20px;
             font-weight: 700;
             color: #1C1C1E;
@@ -611,41 +926,41 @@ def web_page():
             display: flex;
             align-items: center;
             gap: 10px;
-        }}
-        .relay-grid {{
+        }
+        .relay-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 15px;
-        }}
-        .relay-card {{
+        }
+        .relay-card {
             background: #F2F2F7;
             padding: 20px;
             border-radius: 15px;
             text-align: center;
-        }}
-        .relay-name {{
+        }
+        .relay-name {
             font-size: 18px;
             font-weight: 600;
             margin-bottom: 10px;
             color: #1C1C1E;
-        }}
-        .relay-pin {{
+        }
+        .relay-pin {
             font-size: 14px;
             color: #8E8E93;
             margin-bottom: 10px;
-        }}
-        .relay-status {{
+        }
+        .relay-status {
             font-size: 16px;
             font-weight: 600;
             padding: 10px;
             border-radius: 10px;
             margin-bottom: 15px;
-        }}
-        .button-group {{
+        }
+        .button-group {
             display: flex;
             gap: 10px;
-        }}
-        .button {{
+        }
+        .button {
             flex: 1;
             padding: 12px;
             border: none;
@@ -657,56 +972,56 @@ def web_page():
             display: inline-block;
             text-align: center;
             transition: all 0.3s;
-        }}
-        .button-test {{
+        }
+        .button-test {
             background: #007AFF;
             color: white;
-        }}
-        .button-test:hover {{
+        }
+        .button-test:hover {
             background: #0051D5;
-        }}
-        .info-row {{
+        }
+        .info-row {
             display: flex;
             justify-content: space-between;
             padding: 12px 0;
             border-bottom: 1px solid #F2F2F7;
-        }}
-        .info-row:last-child {{
+        }
+        .info-row:last-child {
             border-bottom: none;
-        }}
-        .info-label {{
+        }
+        .info-label {
             color: #8E8E93;
             font-weight: 500;
-        }}
-        .info-value {{
+        }
+        .info-value {
             color: #1C1C1E;
             font-weight: 600;
-        }}
-        .setup-info {{
+        }
+        .setup-info {
             background: #FFF3CD;
             border: 2px solid #FFC107;
             padding: 20px;
             border-radius: 15px;
             margin-top: 20px;
             line-height: 1.8;
-        }}
-        .form-group {{
+        }
+        .form-group {
             margin-top: 20px;
-        }}
-        label {{
+        }
+        label {
             display: block;
             font-weight: 600;
             margin-bottom: 8px;
             color: #1C1C1E;
-        }}
-        input[type="number"] {{
+        }
+        input[type="number"] {
             width: 100%;
             padding: 12px;
             border: 1px solid #D1D1D6;
             border-radius: 10px;
             font-size: 16px;
-        }}
-        .nav-button {{
+        }
+        .nav-button {
             display: inline-block;
             padding: 12px 24px;
             background: white;
@@ -716,8 +1031,26 @@ def web_page():
             font-weight: 600;
             margin-bottom: 20px;
             box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        }}
-    </style>
+        }
+"""
+
+_EVENT_ROW_TEMPLATE = """
+            <div class="info-row">
+                <span class="info-label">{time}</span>
+                <span class="info-value">{type}</span>
+            </div>
+            """
+
+_NO_EVENTS_HTML = '<div style="color: #8E8E93; text-align: center; padding: 20px;">No events received yet</div>'
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>SmartRace Relay Controller</title>
+    <meta http-equiv="refresh" content="10">
+    <style>{css}    </style>
 </head>
 <body>
     <div class="container">
@@ -736,7 +1069,7 @@ def web_page():
                         {relay1_status}
                     </div>
                     <div class="button-group">
-                        <a href="/test1" class="button button-test">Test Pulse</a>
+                        <button type="button" class="button button-test" onclick="fetch('/test1')">Test Pulse</button>
                     </div>
                 </div>
                 
@@ -747,7 +1080,7 @@ def web_page():
                         {relay2_status}
                     </div>
                     <div class="button-group">
-                        <a href="/test2" class="button button-test">Test Pulse</a>
+                        <button type="button" class="button button-test" onclick="fetch('/test2')">Test Pulse</button>
                     </div>
                 </div>
             </div>
@@ -784,28 +1117,23 @@ def web_page():
             </div>
             <div class="info-row">
                 <span class="info-label">Last Event Type</span>
-                <span class="info-value">{last_smartrace_event['type'] if last_smartrace_event else 'None'}</span>
+                <span class="info-value">{last_event_type}</span>
             </div>
             <div class="info-row">
                 <span class="info-label">Last Event Time</span>
-                <span class="info-value">{last_smartrace_event['time'] if last_smartrace_event else 'N/A'}</span>
+                <span class="info-value">{last_event_time}</span>
             </div>
             <div class="info-row">
                 <span class="info-label">Events Received</span>
-                <span class="info-value">{len(smartrace_events_log)}</span>
+                <span class="info-value">{events_received}</span>
             </div>
         </div>
         
         <div class="section">
             <div class="section-title">📜 Recent Events (Last 5)</div>
-            {''.join([f'''
-            <div class="info-row">
-                <span class="info-label">{event['time']}</span>
-                <span class="info-value">{event['type'] if event['type'] else 'Unknown'}</span>
-            </div>
-            ''' for event in smartrace_events_log[-5:][::-1]]) if smartrace_events_log else '<div style="color: #8E8E93; text-align: center; padding: 20px;">No events received yet</div>'}
+            {recent_events}
             <div style="margin-top: 15px; padding: 10px; background: #FFF3CD; border-radius: 10px; font-size: 14px;">
-                <strong>🔍 Debug Tip:</strong> Check the terminal/console output where the script is running. 
+                <strong>🔍 Debug Tip:</strong> Start the script with <code>SMARTRACE_DEBUG=1</code> and check the terminal/console output. 
                 When you press VSC, you should see raw JSON data printed. This will show exactly what SmartRace is sending.
             </div>
         </div>
@@ -814,7 +1142,7 @@ def web_page():
             <div class="section-title">📡 System Information</div>
             <div class="info-row">
                 <span class="info-label">WiFi Network</span>
-                <span class="info-value">{network_info['ssid']}</span>
+                <span class="info-value">{ssid}</span>
             </div>
             <div class="info-row">
                 <span class="info-label">IP Address</span>
@@ -826,7 +1154,7 @@ def web_page():
             </div>
             <div class="info-row">
                 <span class="info-label">Current Time</span>
-                <span class="info-value">{datetime.now().strftime('%H:%M:%S')}</span>
+                <span class="info-value">{current_time}</span>
             </div>
         </div>
         
@@ -847,214 +1175,323 @@ def web_page():
     </div>
 </body>
 </html>"""
-    return html
 
-class WebHandler(BaseHTTPRequestHandler):
+def web_page():
+    """Main web interface HTML (encoded)"""
+    global vsc_active, vsc_end_time, pulse_duration
+    
+    hours, rem = divmod(int(time.monotonic() - startup_time), 3600)
+    minutes = rem // 60
+    
+    current_ip = get_ip_address()
+    network_info = get_current_network_info()
+    
+    relay1_status = "🟢 Active" if relay_state[RELAY1_PIN] else "⚫ Inactive"
+    relay1_color = "#34C759" if relay_state[RELAY1_PIN] else "#8E8E93"
+    
+    relay2_status = "🟢 Active" if relay_state[RELAY2_PIN] else "⚫ Inactive"
+    relay2_color = "#34C759" if relay_state[RELAY2_PIN] else "#8E8E93"
+    
+    vsc_status = "🟢 Running" if vsc_active else "⚫ Inactive"
+    vsc_color = "#34C759" if vsc_active else "#8E8E93"
+    
+    vsc_time_remaining = ""
+    if vsc_active and vsc_end_time is not None:
+        remaining = max(0, int(vsc_end_time - time.monotonic()))
+        vsc_time_remaining = f" ({remaining}s remaining)"
+    
+    # Snapshot in one C-level copy - SmartRace threads append while the rows are formatted
+    recent = list(smartrace_events_log)[-5:]
+    if recent:
+        recent_events = ''.join([
+            _EVENT_ROW_TEMPLATE.format(time=event['time'], type=event['type'] if event['type'] else 'Unknown')
+            for event in reversed(recent)
+        ])
+    else:
+        recent_events = _NO_EVENTS_HTML
+    
+    fields = dict(
+        RELAY1_PIN=RELAY1_PIN,
+        RELAY2_PIN=RELAY2_PIN,
+        SMARTRACE_DATA_PORT=SMARTRACE_DATA_PORT,
+        relay1_status=relay1_status,
+        relay1_color=relay1_color,
+        relay2_status=relay2_status,
+        relay2_color=relay2_color,
+        pulse_duration=pulse_duration,
+        relay1_delay=relay1_delay,
+        vsc_status=vsc_status,
+        vsc_color=vsc_color,
+        vsc_time_remaining=vsc_time_remaining,
+        last_event_type=last_smartrace_event['type'] if last_smartrace_event else 'None',
+        last_event_time=last_smartrace_event['time'] if last_smartrace_event else 'N/A',
+        events_received=len(smartrace_events_log),
+        recent_events=recent_events,
+        ssid=html.escape(network_info['ssid'], quote=True),
+        current_ip=current_ip,
+        hours=hours,
+        minutes=minutes,
+        current_time=time.strftime('%H:%M:%S'),
+    )
+    # Not cached - the clock and uptime change every render, so a key would never repeat
+    return _PAGE_TEMPLATE.format(css=_STATIC_CSS, **fields).encode()
+
+class WebHandler(RelayRequestHandler):
     """HTTP handler for web interface"""
     
+    # Path -> handler method name, looked up once per request
+    _GET_ROUTES = {
+        '/': '_get_root',
+        '/wifi': '_get_wifi',
+        '/test1': '_get_test1',
+        '/test2': '_get_test2',
+    }
+    _POST_ROUTES = {
+        '/wifi/connect': '_post_wifi_connect',
+        '/set-pulse': '_post_set_pulse',
+    }
+    
     def do_GET(self):
         try:
-            parsed_path = urlparse(self.path)
+            if self.path in _NOISE_PATHS:
+                self.send_content(204)
+                return
             
-            if parsed_path.path == '/':
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.end_headers()
-                self.wfile.write(web_page().encode())
-                
-            elif parsed_path.path == '/wifi':
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.end_headers()
-                self.wfile.write(wifi_config_page().encode())
-                
-            elif parsed_path.path == '/test1':
-                pulse_relay_threaded(RELAY1_PIN, "Relay 1", "Manual Test")
-                self.send_response(302)
-                self.send_header('Location', '/')
-                self.end_headers()
-                
-            elif parsed_path.path == '/test2':
-                pulse_relay_threaded(RELAY2_PIN, "Relay 2", "Manual Test")
-                self.send_response(302)
-                self.send_header('Location', '/')
-                self.end_headers()
-                
+            # A plain split is all routing needs - the query is only decoded by handlers that use it
+            path, _, query = self.path.partition('?')
+            
+            name = self._GET_ROUTES.get(path)
+            if name:
+                getattr(self, name)(query)
             else:
-                self.send_response(404)
-                self.end_headers()
+                self.send_content(404)
                 
         except Exception as e:
-            print(f"❌ Web request error: {e}")
+            log.error(f"❌ Web request error: {e}")
+            self.send_failure()
     
     def do_POST(self):
-        global pulse_duration
-        
         try:
-            if self.path == '/wifi/connect':
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length).decode('utf-8')
-                params = parse_qs(post_data)
-                
-                ssid = params.get('ssid', [''])[0]
-                password = params.get('password', [''])[0]
-                ip_mode = params.get('ip_mode', ['dhcp'])[0]
-                
-                use_dhcp = (ip_mode == 'dhcp')
-                static_ip = params.get('static_ip', [''])[0]
-                gateway = params.get('gateway', [''])[0]
-                dns = params.get('dns', ['8.8.8.8'])[0]
-                
-                success, message = connect_to_wifi(ssid, password, use_dhcp, static_ip, gateway, dns)
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.end_headers()
-                
-                status = "✅ Success!" if success else "❌ Failed"
-                response = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Connection Result</title>
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, Arial, sans-serif;
-            background: #F2F2F7;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            min-height: 100vh;
-            padding: 20px;
-        }}
-        .container {{
-            background: white;
-            padding: 40px;
-            border-radius: 20px;
-            text-align: center;
-            max-width: 400px;
-        }}
-        h1 {{ color: {'#34C759' if success else '#FF3B30'}; }}
-        .button {{
-            display: inline-block;
-            padding: 12px 24px;
-            background: #007AFF;
-            color: white;
-            text-decoration: none;
-            border-radius: 10px;
-            margin-top: 20px;
-        }}
-    </style>
-    <meta http-equiv="refresh" content="5;url=/">
-</head>
-<body>
-    <div class="container">
-        <h1>{status}</h1>
-        <p>{message}</p>
-        <p>Redirecting in 5 seconds...</p>
-        <a href="/" class="button">Go Back Now</a>
-    </div>
-</body>
-</html>"""
-                self.wfile.write(response.encode())
+            # Both forms are small urlencoded bodies - read and parse them once
+            params = dict(parse_qsl(self.read_body().decode('utf-8')))
             
-            elif self.path == '/set-pulse':
-                global pulse_duration, relay1_delay
-                
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length).decode('utf-8')
-                params = parse_qs(post_data)
-                
-                new_duration = float(params.get('pulse_duration', [0.5])[0])
-                new_delay = float(params.get('relay1_delay', [5.0])[0])
-                
-                if 0.1 <= new_duration <= 5:
-                    pulse_duration = new_duration
-                if 0 <= new_delay <= 30:
-                    relay1_delay = new_delay
-                    
-                save_config()
-                print(f"✅ Settings saved: Pulse duration = {pulse_duration}s, Relay 1 delay = {relay1_delay}s")                
-                self.send_response(302)
-                self.send_header('Location', '/')
-                self.end_headers()
+            name = self._POST_ROUTES.get(self.path.partition('?')[0])
+            if name:
+                getattr(self, name)(params)
+            else:
+                self.send_content(404)
                 
         except Exception as e:
-            print(f"❌ POST error: {e}")
+            log.error(f"❌ POST error: {e}")
+            self.send_failure()
     
-    def log_message(self, format, *args):
-        pass
+    def send_page(self, page, level=_PAGE_GZIP_LEVEL):
+        """Send a page entry, gzipped (once per entry) if the client accepts gzip"""
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            if page['gz'] is None:
+                page['gz'] = gzip.compress(page['raw'], level)
+            self.send_content(200, page['gz'],
+                              headers=[('Content-Encoding', 'gzip'), ('Vary', 'Accept-Encoding')])
+        else:
+            self.send_content(200, page['raw'], headers=[('Vary', 'Accept-Encoding')])
+    
+    def _get_root(self, query):
+        # Rendered fresh every time, so it gets a one-off entry and a cheap compression level
+        self.send_page({'raw': web_page(), 'gz': None}, _LIVE_GZIP_LEVEL)
+    
+    def _get_wifi(self, query):
+        rescan = bool(query) and parse_qs(query).get('rescan', [''])[0] == 'true'
+        self.send_page(wifi_config_page(rescan))
+    
+    def _get_test1(self, query):
+        pulse_relay_threaded(RELAY1_PIN, "Relay 1", "Manual Test")
+        self.send_content(204)  # Dashboard stays put - no redirect and re-render
+    
+    def _get_test2(self, query):
+        pulse_relay_threaded(RELAY2_PIN, "Relay 2", "Manual Test")
+        self.send_content(204)
+    
+    def _post_wifi_connect(self, params):
+        ssid = params.get('ssid', '')
+        password = params.get('password', '')
+        ip_mode = params.get('ip_mode', 'dhcp')
+        
+        use_dhcp = (ip_mode == 'dhcp')
+        static_ip = params.get('static_ip', '')
+        gateway = params.get('gateway', '')
+        dns = params.get('dns', '8.8.8.8')
+        
+        success, message = connect_to_wifi(ssid, password, use_dhcp, static_ip, gateway, dns)
+        
+        status = "✅ Success!" if success else "❌ Failed"
+        response = _WIFI_RESULT_TEMPLATE.format(
+            status=status,
+            status_color='#34C759' if success else '#FF3B30',
+            message=html.escape(message)  # nmcli stderr and SSIDs are not HTML-safe
+        )
+        self.send_content(200, response.encode())
+    
+    def _post_set_pulse(self, params):
+        global pulse_duration, relay1_delay
+        
+        new_duration = float(params.get('pulse_duration', 0.5))
+        new_delay = float(params.get('relay1_delay', 5.0))
+        
+        if 0.1 <= new_duration <= 5:
+            pulse_duration = new_duration
+        if 0 <= new_delay <= 30:
+            relay1_delay = new_delay
+            
+        save_config()
+        log.info(f"✅ Settings updated: Pulse duration = {pulse_duration}s, Relay 1 delay = {relay1_delay}s")
+        self.send_content(302, headers=[('Location', '/')])
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server that runs requests on a fixed-size worker pool"""
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, max_workers=HTTP_WORKERS):
+        # Pool first - a failed bind calls server_close(), and its error should be the bind's
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        super().__init__(server_address, handler_class)
+    
+    def process_request(self, request, client_address):
+        # Queue the connection for a pooled worker instead of spawning a thread per request
+        self.pool.submit(self.process_request_thread, request, client_address)
+    
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
 
 def start_smartrace_data_server():
     """Start SmartRace data interface server"""
     try:
-        server = HTTPServer(('0.0.0.0', SMARTRACE_DATA_PORT), SmartRaceDataHandler)
-        print(f"✅ SmartRace data server started on port {SMARTRACE_DATA_PORT}")
+        server = PooledHTTPServer(('0.0.0.0', SMARTRACE_DATA_PORT), SmartRaceDataHandler)
+        log.info(f"✅ SmartRace data server started on port {SMARTRACE_DATA_PORT}")
         server.serve_forever()
     except Exception as e:
-        print(f"❌ SmartRace server error: {e}")
+        log.error(f"❌ SmartRace server error: {e}")
+
+def start_aiohttp_smartrace_server():
+    """Serve SmartRace events from an asyncio event loop (aiohttp)"""
+    async def handle_event(request):
+        try:
+            handle_smartrace_event(await request.read())
+        except Exception as e:
+            log.exception(f"❌ SmartRace data error: {e}")
+            return web.Response(status=500)
+        return web.Response(body=b'{"status":"ok"}', content_type='application/json')
+    
+    async def serve():
+        app = web.Application()
+        app.router.add_post('/{tail:.*}', handle_event)  # Same as the threaded handler: any path
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '0.0.0.0', SMARTRACE_DATA_PORT).start()
+        log.info(f"✅ SmartRace data server started on port {SMARTRACE_DATA_PORT} (aiohttp)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+    
+    try:
+        asyncio.run(serve())
+    except Exception as e:
+        log.error(f"❌ SmartRace server error: {e}")
 
 def start_web_server():
     """Start web interface server"""
     try:
-        server = HTTPServer(('0.0.0.0', WEB_SERVER_PORT), WebHandler)
-        print(f"✅ Web server started on port {WEB_SERVER_PORT}")
+        server = PooledHTTPServer(('0.0.0.0', WEB_SERVER_PORT), WebHandler)
+        log.info(f"✅ Web server started on port {WEB_SERVER_PORT}")
         server.serve_forever()
     except Exception as e:
-        print(f"❌ Web server error: {e}")
+        log.error(f"❌ Web server error: {e}")
 
 def cleanup():
     """Cleanup on exit"""
+    flush_config()
     if GPIO_AVAILABLE:
         try:
             GPIO.cleanup()
-            print("🧹 GPIO cleanup")
+            log.info("🧹 GPIO cleanup")
         except:
             pass
+    if _log_listener is not None:
+        _log_listener.stop()  # Drains anything still queued
+
+def handle_sigterm(signum, frame):
+    """Turn systemd's stop/restart SIGTERM into a normal exit so cleanup() runs"""
+    raise SystemExit(0)
+
+def wait_for_network(timeout=NETWORK_WAIT_TIMEOUT):
+    """Wait until we have an IP address, or until timeout seconds have passed"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        get_ip_address.cache_clear()  # Don't let the cache hide the address appearing
+        if get_ip_address() != '0.0.0.0':
+            return True
+        time.sleep(0.25)
+    log.warning(f"⚠️ No network after {timeout}s - starting anyway")
+    return False
 
 def main():
     """Main function"""
-    print("🚀 Starting SmartRace Dual Relay Pulse Controller...")
-    print(f"🐍 Python: {sys.version.split()[0]}")
+    setup_logging()
+    log.info("🚀 Starting SmartRace Dual Relay Pulse Controller...")
+    log.info(f"🐍 Python: {sys.version.split()[0]}")
     
     load_config()
     setup_gpio()
     
-    print("⏳ Waiting for network...")
-    time.sleep(5)
+    log.info("⏳ Waiting for network...")
+    wait_for_network()
     
     current_ip = get_ip_address()
     network_info = get_current_network_info()
     
-    print("=" * 60)
-    print("🎯 SMARTRACE DUAL RELAY CONTROLLER STARTED")
-    print("=" * 60)
-    print(f"📡 Network: {network_info['ssid']}")
-    print(f"🌐 IP Address: {current_ip}")
-    print(f"📱 Web Interface: http://{current_ip}:{WEB_SERVER_PORT}")
-    print(f"⚙️ WiFi Config: http://{current_ip}:{WEB_SERVER_PORT}/wifi")
-    print(f"🔧 SmartRace Data: http://{current_ip}:{SMARTRACE_DATA_PORT}")
-    print(f"🔌 Relay 1 (Start): GPIO {RELAY1_PIN}")
-    print(f"🔌 Relay 2 (End): GPIO {RELAY2_PIN}")
-    print(f"⏱️ Pulse Duration: {pulse_duration} seconds")
-    print("=" * 60)
-    print("📋 OPERATION:")
-    print("   • VSC Start → Relay 1 pulses (race start signal)")
-    print("   • VSC End → Relay 2 pulses (race end signal)")
-    print("=" * 60)
+    log.info("=" * 60)
+    log.info("🎯 SMARTRACE DUAL RELAY CONTROLLER STARTED")
+    log.info("=" * 60)
+    log.info(f"📡 Network: {network_info['ssid']}")
+    log.info(f"🌐 IP Address: {current_ip}")
+    log.info(f"📱 Web Interface: http://{current_ip}:{WEB_SERVER_PORT}")
+    log.info(f"⚙️ WiFi Config: http://{current_ip}:{WEB_SERVER_PORT}/wifi")
+    log.info(f"🔧 SmartRace Data: http://{current_ip}:{SMARTRACE_DATA_PORT}")
+    log.info(f"🔌 Relay 1 (Start): GPIO {RELAY1_PIN}")
+    log.info(f"🔌 Relay 2 (End): GPIO {RELAY2_PIN}")
+    log.info(f"⏱️ Pulse Duration: {pulse_duration} seconds")
+    log.info(f"📦 JSON Parser: {'orjson' if ORJSON_AVAILABLE else 'json (stdlib)'}")
+    log.info(f"📨 SmartRace Server: {'aiohttp' if AIOHTTP_AVAILABLE else 'threaded (stdlib)'}")
+    log.info("=" * 60)
+    log.info("📋 OPERATION:")
+    log.info("   • VSC Start → Relay 1 pulses (race start signal)")
+    log.info("   • VSC End → Relay 2 pulses (race end signal)")
+    log.info("=" * 60)
+    
+    # systemctl stop/restart and reboots send SIGTERM - flush pending settings on the way out
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
     try:
+        # Start relay pulse workers
+        start_pulse_workers()
+        
         # Start VSC timer monitor thread
         timer_thread = threading.Thread(target=monitor_vsc_timer, daemon=True)
         timer_thread.start()
         
         # Start servers
-        smartrace_thread = threading.Thread(target=start_smartrace_data_server, daemon=True)
+        if AIOHTTP_AVAILABLE:
+            smartrace_server = start_aiohttp_smartrace_server
+        else:
+            smartrace_server = start_smartrace_data_server
+        smartrace_thread = threading.Thread(target=smartrace_server, daemon=True)
         smartrace_thread.start()
         start_web_server()
-    except KeyboardInterrupt:
-        print("\n🛑 Shutting down...")
+    except (KeyboardInterrupt, SystemExit):
+        log.info("\n🛑 Shutting down...")
     finally:
         cleanup()
 